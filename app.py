@@ -1,7 +1,11 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import plotly.io as pio
+
+# orjson serializes the ndarray trace data far faster than stdlib json
+pio.json.config.default_engine = 'orjson'
 
 # --- 1. PAGE CONFIGURATION ---
 st.set_page_config(
@@ -10,8 +14,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for Visibility and Contrast
-st.markdown("""
+# Custom CSS for Visibility and Contrast (sent once per session in main)
+_CSS = """
     <style>
     /* 1. Main Background */
     .stApp {
@@ -83,64 +87,196 @@ st.markdown("""
         color: #2d3748;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
 
 # --- 2. DATA LOADING ---
-@st.cache_data
+@st.cache_data(persist="disk", show_spinner=False)
 def load_data():
     # Pointing to the specific GitHub/project folder structure
-    file_path = 'data/df_stable_only.csv'
-    
+    file_path = 'data/df_stable_only.parquet'
+
     try:
-        df = pd.read_csv(file_path)
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+        # Parquet keeps the Timestamp column typed, so no string parsing
+        # and no pd.to_datetime pass on load.
+        df = pd.read_parquet(file_path, engine='pyarrow')
+        # float32 is plenty for sensor readings and halves memory plus the
+        # bytes Plotly serializes; categorical batch_id keeps a sorted,
+        # cached list of batches for the selector.
+        sensor_cols = ['Process Temp', 'Process Temp SP', 'Pressure SP',
+                       'Inlet Steam Pressure', 'Outlet Steam Pressure',
+                       'Steam Flow Rate', 'QualSteam Valve Opening']
+        df[sensor_cols] = df[sensor_cols].astype('float32')
+        df['batch_id'] = df['batch_id'].astype('category')
+        # Sort so each batch is a contiguous run of rows; the batch index
+        # can then slice views instead of gathering rows.
+        df = df.sort_values(['batch_id', 'Timestamp'], kind='mergesort').reset_index(drop=True)
         return df
     except FileNotFoundError:
         return None
 
-def calculate_stats(series):
+@st.cache_resource
+def _batch_index(df):
+    # df arrives sorted by (batch_id, Timestamp), so every batch is a
+    # contiguous run of rows; searchsorted finds the run boundaries and
+    # iloc slicing hands out zero-copy views rather than groupby copies.
+    ids = df['batch_id'].to_numpy()
+    batch_ids = df['batch_id'].cat.categories.to_numpy()
+    starts = np.searchsorted(ids, batch_ids, side='left')
+    ends = np.append(starts[1:], len(df))
+    return {batch_id: df.iloc[lo:hi]
+            for batch_id, lo, hi in zip(batch_ids, starts, ends)}
+
+STAT_COLS = ['Process Temp', 'Outlet Steam Pressure', 'Inlet Steam Pressure',
+             'Steam Flow Rate', 'QualSteam Valve Opening']
+
+@st.cache_data
+def _all_stats(df):
+    # One vectorized groupby over the whole file; per-batch selection is
+    # then a single .loc lookup instead of five reductions per card.
+    return df.groupby('batch_id', observed=True)[STAT_COLS].agg(
+        ['mean', 'median', 'max', 'min', 'std'])
+
+# More points than this adds nothing visible on screen, just JSON payload.
+MAX_PLOT_POINTS = 2000
+
+def _downsample(batch_data, n_out=MAX_PLOT_POINTS):
+    if len(batch_data) <= n_out:
+        return batch_data
+    step = -(-len(batch_data) // n_out)  # ceil division
+    return batch_data.iloc[::step]
+
+@st.cache_data
+def _batch_times(df):
+    # Start/end/duration for every batch in one vectorized groupby,
+    # instead of per-rerun min/max scans over the selected batch.
+    t = df.groupby('batch_id', observed=True)['Timestamp'].agg(['min', 'max'])
+    t['duration_min'] = (t['max'] - t['min']).dt.total_seconds() / 60.0
+    # Preformat the display strings here too, so reruns do zero strftime work
+    t['date_str'] = t['min'].dt.strftime('%Y-%m-%d')
+    t['start_hms'] = t['min'].dt.strftime('%H:%M:%S')
+    t['end_hms'] = t['max'].dt.strftime('%H:%M:%S')
+    return t
+
+def format_stats(row):
+    # row is one column's ['mean','median','max','min','std'] slice
+    # from the cached per-batch stats table.
     return {
-        "Mean": f"{series.mean():.2f}",
-        "Median": f"{series.median():.2f}",
-        "Max": f"{series.max():.2f}",
-        "Min": f"{series.min():.2f}",
-        "Std Dev": f"{series.std():.4f}"
+        "Mean": f"{row['mean']:.2f}",
+        "Median": f"{row['median']:.2f}",
+        "Max": f"{row['max']:.2f}",
+        "Min": f"{row['min']:.2f}",
+        "Std Dev": f"{row['std']:.4f}"
     }
 
-# --- 3. MAIN APPLICATION ---
-def main():
-    # Header
-    st.title("QualSteam Real Dairy Stable Process (SOPT Included)")
-
-    # Load Data
-    df = load_data()
+# Colors (shared by the figure traces and the stat card borders)
+C_TEMP = '#D32F2F'       # Red
+C_TEMP_SP = 'black'      # Black
+C_P1 = '#004D40'         # Teal
+C_P2 = '#00008B'         # Dark Blue
+C_P_SP = '#1A237E'       # Indigo
+C_FLOW = '#7B1FA2'       # Violet
+C_VALVE = '#B8860B'      # Dark Goldenrod
+
+# Four stacked panels sharing one x-axis, top to bottom. The layout is
+# precomputed once at module load; build_figure only adds traces to it,
+# which is cheaper than re-wiring make_subplots per call.
+_PANEL_TITLES = ("Temperature", "Pressure (Inlet & Outlet)", "Steam Flow Rate", "Valve Opening")
+_PANEL_DOMAINS = ([0.7725, 1.0], [0.515, 0.7425], [0.2575, 0.485], [0.0, 0.2275])
+
+_AXIS_STYLE = dict(
+    gridcolor='#f0f0f0',
+    tickfont=dict(color='black'),
+    title_font=dict(color='black')
+)
 
-    if df is None:
-        st.error(f"Data file not found at `data/df_stable_only.csv`. Please ensure the file exists in your repository.")
-        st.stop()
+_BASE_LAYOUT = dict(
+    height=900,
+    showlegend=True,
+    plot_bgcolor="white",
+    paper_bgcolor="white",
+    hovermode="x unified",
+    margin=dict(l=20, r=20, t=50, b=20),
+    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(color="black")),
+    font=dict(color="black"), # Force all global text to black
+    xaxis=dict(anchor='y4', **_AXIS_STYLE),
+    yaxis=dict(domain=_PANEL_DOMAINS[0], title_text="Temp (°C)", **_AXIS_STYLE),
+    yaxis2=dict(domain=_PANEL_DOMAINS[1], title_text="Bar", **_AXIS_STYLE),
+    yaxis3=dict(domain=_PANEL_DOMAINS[2], title_text="kg/hr", **_AXIS_STYLE),
+    yaxis4=dict(domain=_PANEL_DOMAINS[3], title_text="%", range=[0, 105], **_AXIS_STYLE),
+    # Panel titles, black like the rest of the text
+    annotations=[
+        dict(text=title, x=0.5, xref='paper', xanchor='center',
+             y=domain[1], yref='paper', yanchor='bottom',
+             showarrow=False, font=dict(color='black', size=16))
+        for title, domain in zip(_PANEL_TITLES, _PANEL_DOMAINS)
+    ],
+)
 
-    # --- SIDEBAR: GLOBAL STATS & SELECTION ---
-    st.sidebar.header("Dataset Overview")
-    
-    # Global Metrics Calculation
-    # Hardcoded total based on provided analysis (calculate_coverage.py)
-    TOTAL_RAW_ROWS = 41830 
-    stable_rows = len(df)
-    coverage_pct = (stable_rows / TOTAL_RAW_ROWS) * 100
-    
-    st.sidebar.info(f"""
-    **Total Raw Data Rows:** {TOTAL_RAW_ROWS:,}
-    \n**Stable Process Rows:** {stable_rows:,}
-    \n**Stable Data Percentage:** {coverage_pct:.2f}%
-    """)
-    
-    st.sidebar.markdown("---")
+@st.cache_data
+def build_figure(batch_id):
+    # Construct the figure once per batch and cache the serialized dict;
+    # the cache key is just the scalar batch_id, so reruns that keep the
+    # same selection skip all of this.
+    plot_data = _downsample(_batch_index(load_data())[batch_id])
+
+    # Extract each column once as a plain ndarray: a single __getitem__
+    # per signal, and ndarrays take Plotly's fast serialization path
+    # where Series would be walked element by element.
+    ts = plot_data['Timestamp'].to_numpy()
+    temp = plot_data['Process Temp'].to_numpy()
+    temp_sp = plot_data['Process Temp SP'].to_numpy()
+    p_sp = plot_data['Pressure SP'].to_numpy()
+    p1 = plot_data['Inlet Steam Pressure'].to_numpy()
+    p2 = plot_data['Outlet Steam Pressure'].to_numpy()
+    flow = plot_data['Steam Flow Rate'].to_numpy()
+    valve = plot_data['QualSteam Valve Opening'].to_numpy()
+
+    fig = go.Figure(layout=_BASE_LAYOUT)
+
+    # 1. Temperature
+    fig.add_trace(go.Scattergl(x=ts, y=temp_sp,
+                               mode='lines', line=dict(color=C_TEMP_SP, dash='dot', width=2),
+                               name='Process Temp SP', yaxis='y'))
+    fig.add_trace(go.Scattergl(x=ts, y=temp,
+                               mode='lines', line=dict(color=C_TEMP, width=2),
+                               name='Process Temp', yaxis='y'))
+
+    # 2. Pressure
+    fig.add_trace(go.Scattergl(x=ts, y=p_sp,
+                               mode='lines', line=dict(color=C_P_SP, dash='dot', width=2),
+                               name='Pressure SP', yaxis='y2'))
+    fig.add_trace(go.Scattergl(x=ts, y=p1,
+                               mode='lines', line=dict(color=C_P1, width=2),
+                               name='Inlet P1', yaxis='y2'))
+    fig.add_trace(go.Scattergl(x=ts, y=p2,
+                               mode='lines', line=dict(color=C_P2, width=2),
+                               fill='tozeroy', fillcolor='rgba(0, 0, 139, 0.1)', # Light blue fill
+                               name='Outlet P2', yaxis='y2'))
+
+    # 3. Flow
+    fig.add_trace(go.Scattergl(x=ts, y=flow,
+                               mode='lines', line=dict(color=C_FLOW, width=2),
+                               fill='tozeroy', fillcolor='rgba(123, 31, 162, 0.1)',
+                               name='Flow Rate', yaxis='y3'))
+
+    # 4. Valve
+    fig.add_trace(go.Scattergl(x=ts, y=valve,
+                               mode='lines', line=dict(color=C_VALVE, width=2),
+                               fill='tozeroy', fillcolor='rgba(184, 134, 11, 0.1)',
+                               name='Valve %', yaxis='y4'))
+
+    return fig.to_dict()
+
+@st.fragment
+def render_batch(df):
+    # Batch selector plus everything that depends on it. As a fragment,
+    # changing the selection reruns only this block — the CSS, title and
+    # dataset overview above are not re-executed.
     st.sidebar.header("Batch Selection")
-    
-    # Get unique batches
-    unique_batches = df['batch_id'].unique()
-    unique_batches.sort()
-    
+
+    # Get unique batches (categories are already sorted)
+    unique_batches = df['batch_id'].cat.categories.to_numpy()
+
     selected_batch_id = st.sidebar.selectbox(
         "Select Batch ID",
         unique_batches,
@@ -151,15 +287,11 @@ def main():
         st.info("No batches available.")
         st.stop()
 
-    # Filter Data
-    batch_data = df[df['batch_id'] == selected_batch_id].copy()
-    
-    # Calculate Time Metrics
-    start_time = batch_data['Timestamp'].min()
-    end_time = batch_data['Timestamp'].max()
-    duration = (end_time - start_time).total_seconds() / 60.0
-    date_str = start_time.strftime('%Y-%m-%d')
-    time_range_str = f"{start_time.strftime('%H:%M:%S')} - {end_time.strftime('%H:%M:%S')}"
+    # Time Metrics (precomputed per batch)
+    time_row = _batch_times(df).loc[selected_batch_id]
+    duration = time_row['duration_min']
+    date_str = time_row['date_str']
+    time_range_str = f"{time_row['start_hms']} - {time_row['end_hms']}"
 
     # --- TOP METRICS ROW ---
     c1, c2, c3, c4 = st.columns(4)
@@ -175,103 +307,21 @@ def main():
     st.markdown("---")
 
     # --- VISUALIZATION & STATS ---
-    
+
     # Layout: Graphs on Left (Wide), Stats on Right (Narrow)
     col_graph, col_stats = st.columns([3, 1])
 
     with col_graph:
         st.subheader(f"Interactive Process Analysis - Batch {selected_batch_id}")
-        
-        # Create Subplots
-        fig = make_subplots(
-            rows=4, cols=1,
-            shared_xaxes=True,
-            vertical_spacing=0.03,
-            subplot_titles=("Temperature", "Pressure (Inlet & Outlet)", "Steam Flow Rate", "Valve Opening"),
-            row_heights=[0.25, 0.25, 0.25, 0.25]
-        )
-
-        # Colors
-        c_temp = '#D32F2F'       # Red
-        c_temp_sp = 'black'      # Black
-        c_p1 = '#004D40'         # Teal
-        c_p2 = '#00008B'         # Dark Blue
-        c_p_sp = '#1A237E'       # Indigo
-        c_flow = '#7B1FA2'       # Violet
-        c_valve = '#B8860B'      # Dark Goldenrod
-
-        # 1. Temperature
-        fig.add_trace(go.Scatter(x=batch_data['Timestamp'], y=batch_data['Process Temp SP'],
-                                 mode='lines', line=dict(color=c_temp_sp, dash='dot', width=2),
-                                 name='Process Temp SP'), row=1, col=1)
-        fig.add_trace(go.Scatter(x=batch_data['Timestamp'], y=batch_data['Process Temp'],
-                                 mode='lines', line=dict(color=c_temp, width=2),
-                                 name='Process Temp'), row=1, col=1)
-
-        # 2. Pressure
-        fig.add_trace(go.Scatter(x=batch_data['Timestamp'], y=batch_data['Pressure SP'],
-                                 mode='lines', line=dict(color=c_p_sp, dash='dot', width=2),
-                                 name='Pressure SP'), row=2, col=1)
-        fig.add_trace(go.Scatter(x=batch_data['Timestamp'], y=batch_data['Inlet Steam Pressure'],
-                                 mode='lines', line=dict(color=c_p1, width=2),
-                                 name='Inlet P1'), row=2, col=1)
-        fig.add_trace(go.Scatter(x=batch_data['Timestamp'], y=batch_data['Outlet Steam Pressure'],
-                                 mode='lines', line=dict(color=c_p2, width=2),
-                                 fill='tozeroy', fillcolor='rgba(0, 0, 139, 0.1)', # Light blue fill
-                                 name='Outlet P2'), row=2, col=1)
-
-        # 3. Flow
-        fig.add_trace(go.Scatter(x=batch_data['Timestamp'], y=batch_data['Steam Flow Rate'],
-                                 mode='lines', line=dict(color=c_flow, width=2),
-                                 fill='tozeroy', fillcolor='rgba(123, 31, 162, 0.1)',
-                                 name='Flow Rate'), row=3, col=1)
-
-        # 4. Valve
-        fig.add_trace(go.Scatter(x=batch_data['Timestamp'], y=batch_data['QualSteam Valve Opening'],
-                                 mode='lines', line=dict(color=c_valve, width=2),
-                                 fill='tozeroy', fillcolor='rgba(184, 134, 11, 0.1)',
-                                 name='Valve %'), row=4, col=1)
-
-        # Update Layout
-        fig.update_layout(
-            height=900,
-            showlegend=True,
-            plot_bgcolor="white",
-            paper_bgcolor="white",
-            hovermode="x unified",
-            margin=dict(l=20, r=20, t=50, b=20),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(color="black")),
-            font=dict(color="black") # Force all global text to black
-        )
-
-        # Explicitly ensure subplot titles are black
-        fig.update_annotations(font_color="black", font_size=16)
-        
-        # Explicitly set axis tick labels and titles to black
-        axis_font_settings = dict(
-            gridcolor='#f0f0f0',
-            tickfont=dict(color='black'),
-            title_font=dict(color='black')
-        )
-
-        # Apply axis settings
-        fig.update_yaxes(title_text="Temp (°C)", row=1, col=1, **axis_font_settings)
-        fig.update_yaxes(title_text="Bar", row=2, col=1, **axis_font_settings)
-        fig.update_yaxes(title_text="kg/hr", row=3, col=1, **axis_font_settings)
-        fig.update_yaxes(title_text="%", row=4, col=1, range=[0, 105], **axis_font_settings)
-        
-        fig.update_xaxes(row=4, col=1, **axis_font_settings)
-
-        st.plotly_chart(fig, use_container_width=True)
+
+        st.plotly_chart(build_figure(selected_batch_id), use_container_width=True)
 
     with col_stats:
         st.subheader("Statistics")
-        # Using HTML to force text color to black
-        st.markdown('<p style="color:black; font-weight:500;">Detailed breakdown for the stable phase.</p>', unsafe_allow_html=True)
-        
-        # Helper to display stats card
+
+        # Helper returning one stat card's HTML fragment
         def stat_card(title, stats_dict, color_border):
-            st.markdown(f"""
+            return f"""
             <div class="stat-box" style="border-left: 5px solid {color_border};">
                 <h4 style="margin:0; color: #1a202c; font-size: 16px;">{title}</h4>
                 <div style="font-size: 0.95em; margin-top: 8px; color: #4a5568;">
@@ -282,23 +332,59 @@ def main():
                     <div style="display:flex; justify-content:space-between;"><span>Std:</span> <b>{stats_dict['Std Dev']}</b></div>
                 </div>
             </div>
-            """, unsafe_allow_html=True)
-
-        # 1. Temp Stats
-        stats_temp = calculate_stats(batch_data['Process Temp'])
-        stat_card("Process Temp (°C)", stats_temp, c_temp)
-
-        # 2. P2 Stats
-        stats_p2 = calculate_stats(batch_data['Outlet Steam Pressure'])
-        stat_card("Outlet Pressure P2 (Bar)", stats_p2, c_p2)
-        
-        # 3. Flow Stats
-        stats_flow = calculate_stats(batch_data['Steam Flow Rate'])
-        stat_card("Steam Flow (kg/hr)", stats_flow, c_flow)
-
-        # 4. Valve Stats
-        stats_valve = calculate_stats(batch_data['QualSteam Valve Opening'])
-        stat_card("Valve Opening (%)", stats_valve, c_valve)
+            """
+
+        # Precomputed stats for the selected batch (single .loc lookup)
+        stats_row = _all_stats(df).loc[selected_batch_id]
+
+        # Emit the intro and all four cards in one st.markdown: a single
+        # websocket message and DOM update instead of five.
+        parts = [
+            # Using HTML to force text color to black
+            '<p style="color:black; font-weight:500;">Detailed breakdown for the stable phase.</p>',
+            stat_card("Process Temp (°C)", format_stats(stats_row['Process Temp']), C_TEMP),
+            stat_card("Outlet Pressure P2 (Bar)", format_stats(stats_row['Outlet Steam Pressure']), C_P2),
+            stat_card("Steam Flow (kg/hr)", format_stats(stats_row['Steam Flow Rate']), C_FLOW),
+            stat_card("Valve Opening (%)", format_stats(stats_row['QualSteam Valve Opening']), C_VALVE),
+        ]
+        st.markdown("".join(parts), unsafe_allow_html=True)
+
+# --- 3. MAIN APPLICATION ---
+def main():
+    # Inject the CSS. This must be re-emitted on every run: Streamlit
+    # clears elements that are not re-emitted, so a once-per-session gate
+    # would drop the <style> block (and all custom styling) on rerun.
+    st.markdown(_CSS, unsafe_allow_html=True)
+
+    # Header
+    st.title("QualSteam Real Dairy Stable Process (SOPT Included)")
+
+    # Load Data
+    df = load_data()
+
+    if df is None:
+        st.error(f"Data file not found at `data/df_stable_only.parquet`. Please ensure the file exists in your repository.")
+        st.stop()
+
+    # --- SIDEBAR: GLOBAL STATS & SELECTION ---
+    st.sidebar.header("Dataset Overview")
+    
+    # Global Metrics Calculation
+    # Hardcoded total based on provided analysis (calculate_coverage.py)
+    TOTAL_RAW_ROWS = 41830 
+    stable_rows = len(df)
+    coverage_pct = (stable_rows / TOTAL_RAW_ROWS) * 100
+    
+    st.sidebar.info(f"""
+    **Total Raw Data Rows:** {TOTAL_RAW_ROWS:,}
+    \n**Stable Process Rows:** {stable_rows:,}
+    \n**Stable Data Percentage:** {coverage_pct:.2f}%
+    """)
+    
+    st.sidebar.markdown("---")
+
+    # Batch selection and everything downstream of it live in a fragment
+    render_batch(df)
 
 if __name__ == "__main__":
     main()